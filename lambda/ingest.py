@@ -4,32 +4,100 @@ import io
 import json
 import re
 import uuid
+from decimal import Decimal
 import hashlib
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, BinaryIO, Iterable, List, Tuple
+
+try:
+    import orjson
+except ImportError:  # not bundled in the Lambda zip; stdlib json is the fallback
+    orjson = None
 
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+# Parallel BatchWriteItem workers; the client pool must be at least this big
+BATCH_WRITE_WORKERS = 8
 
-s3 = boto3.client("s3")
-ddb = boto3.client("dynamodb")
+# Shared by both clients: room for the batch-write and multipart-upload
+# threads, kept-alive connections across warm invocations, adaptive retries
+CLIENT_CONFIG = Config(
+    max_pool_connections=32,
+    retries={"mode": "adaptive", "max_attempts": 10},
+    tcp_keepalive=True,
+)
+
+s3 = boto3.client("s3", config=CLIENT_CONFIG)
+ddb = boto3.client("dynamodb", config=CLIENT_CONFIG)
 
 EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
 SSN_RE = re.compile(r"^\d{3}-\d{2}-\d{4}$")
+TOKEN_SPLIT_RE = re.compile(r"[\W_]+")
+UUID_RE = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\Z")
+DATE_RE = re.compile(r"^[0-9]{4}-[0-9]{2}-[0-9]{2}\Z")
+CREATED_RE = re.compile(r"^[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}(?:\.[0-9]+)?Z?\Z")
+AMOUNT_RE = re.compile(r"^([0-9]+)(?:\.([0-9]{1,2}))?\Z")
+
+CENTS = Decimal("0.01")
 
 ALLOWED_TX_TYPES = {"WIRE", "ACH", "CARD", "CASH", "CHECK"}
 ALLOWED_REGIONS = {"NE", "MW", "S", "W"}
 
+REQUIRED_FIELDS = (
+    "disclosure_id",
+    "institution_name",
+    "transaction_type",
+    "transaction_amount",
+    "transaction_date",
+    "reporting_region",
+    "ssn",
+    "email",
+    "created_at",
+)
+
 BUCKET_NAME = os.environ["BUCKET_NAME"]
 CURATED_PREFIX = os.environ["CURATED_PREFIX"]
 QUARANTINE_PREFIX = os.environ["QUARANTINE_PREFIX"]
 DDB_TABLE_NAME = os.environ["DDB_TABLE_NAME"]
+DDB_TOKENS_TABLE_NAME = os.environ["DDB_TOKENS_TABLE_NAME"]
 PII_HASH_SALT = os.environ["PII_HASH_SALT"]
 
+# Primary key attributes of each table batch_write targets
+TABLE_KEY_ATTRS = {
+    DDB_TABLE_NAME: ("disclosure_id",),
+    DDB_TOKENS_TABLE_NAME: ("token", "disclosure_id"),
+}
+
+MB = 1024 * 1024
+
+# JSONL outputs stay in memory up to this size, then spill to /tmp
+SPOOL_MAX_BYTES = 64 * MB
 
-def sha256_hex(value: str) -> str:
-    h = hashlib.sha256()
-    h.update((value + PII_HASH_SALT).encode("utf-8"))
-    return h.hexdigest()
+# Files under 8 MiB go up as a single PutObject; larger ones are split
+# into 8 MiB parts uploaded in parallel
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * MB,
+    multipart_chunksize=8 * MB,
+    max_concurrency=8,
+    use_threads=True,
+)
+
+
+def sha256_batch(values: List[str], salt: str = PII_HASH_SALT) -> List[str]:
+    # Hash a whole column at once: encode the salt once and keep the
+    # hashlib constructor local so the loop stays cheap per value.
+    # hashlib is OpenSSL-backed and already uses SHA-NI when the CPU has it.
+    # Repeated values (same person on several rows) are hashed only once.
+    salt_b = salt.encode("utf-8")
+    sha256 = hashlib.sha256
+    digests = {v: sha256(v.encode("utf-8") + salt_b).hexdigest() for v in dict.fromkeys(values)}
+    return [digests[v] for v in values]
 
 
 def mask_ssn(ssn: str) -> str:
@@ -49,103 +117,234 @@ def mask_email(email: str) -> str:
 
 
 def parse_date(d: str) -> str:
-    # accept YYYY-MM-DD
+    # accept YYYY-MM-DD; fixed-width input skips strptime, and date()
+    # still rejects out-of-range months/days
+    if DATE_RE.match(d):
+        return date(int(d[0:4]), int(d[5:7]), int(d[8:10])).isoformat()
     dt = datetime.strptime(d, "%Y-%m-%d").date()
     return dt.isoformat()
 
 
 def parse_amount(a: str) -> str:
-    # store as string in DynamoDB N type safely
-    val = float(a)
+    # store as string in DynamoDB N type safely, keeping 2 decimals
+    m = AMOUNT_RE.match(a)
+    if m:
+        # plain "123" / "123.4" / "123.45": format without a float round-trip
+        whole, frac = m.groups()
+        return f"{int(whole)}.{(frac or '').ljust(2, '0')}"
+    val = Decimal(a.strip())
     if val < 0:
         raise ValueError("transaction_amount must be >= 0")
-    # keep 2 decimals
-    return f"{val:.2f}"
-
-
-def validate_row(r: Dict[str, str]) -> Tuple[bool, str]:
-    required = [
-        "disclosure_id",
-        "institution_name",
-        "transaction_type",
-        "transaction_amount",
-        "transaction_date",
-        "reporting_region",
-        "ssn",
-        "email",
-        "created_at",
-    ]
-    for k in required:
-        if k not in r or r[k] is None or str(r[k]).strip() == "":
-            return False, f"missing_required_field:{k}"
+    return str(val.quantize(CENTS))
 
-    # UUID
-    try:
-        uuid.UUID(r["disclosure_id"])
-    except Exception:
-        return False, "invalid_disclosure_id_uuid"
+
+def validate_row(r: Dict[str, str]) -> Tuple[bool, str, Dict[str, str]]:
+    # Returns (ok, reason, parsed); parsed holds the normalized field values
+    # (stripped strings, "%.2f" amount, ISO date) so callers don't redo them
+    for k in REQUIRED_FIELDS:
+        v = r.get(k)
+        if not v or not v.strip():
+            return False, f"missing_required_field:{k}", {}
+
+    # UUID (canonical form by regex; uuid.UUID only for other spellings)
+    if not UUID_RE.match(r["disclosure_id"]):
+        try:
+            uuid.UUID(r["disclosure_id"])
+        except Exception:
+            return False, "invalid_disclosure_id_uuid", {}
 
     # tx type / region
     if r["transaction_type"] not in ALLOWED_TX_TYPES:
-        return False, "invalid_transaction_type"
+        return False, "invalid_transaction_type", {}
     if r["reporting_region"] not in ALLOWED_REGIONS:
-        return False, "invalid_reporting_region"
+        return False, "invalid_reporting_region", {}
 
     # amount/date
     try:
-        _ = parse_amount(r["transaction_amount"])
+        amount = parse_amount(r["transaction_amount"])
     except Exception:
-        return False, "invalid_transaction_amount"
+        return False, "invalid_transaction_amount", {}
 
     try:
-        _ = parse_date(r["transaction_date"])
+        tx_date = parse_date(r["transaction_date"])
     except Exception:
-        return False, "invalid_transaction_date"
+        return False, "invalid_transaction_date", {}
 
     # ssn/email formats
     if not SSN_RE.match(r["ssn"]):
-        return False, "invalid_ssn_format"
+        return False, "invalid_ssn_format", {}
     if not EMAIL_RE.match(r["email"]):
-        return False, "invalid_email_format"
-
-    # created_at parse (ISO-ish)
-    try:
-        # tolerate "2026-02-25T10:00:00" etc.
-        datetime.fromisoformat(r["created_at"].replace("Z", ""))
-    except Exception:
-        return False, "invalid_created_at"
-
-    return True, ""
-
-
-def to_ddb_item(masked: Dict[str, Any]) -> Dict[str, Any]:
-    # DynamoDB expects typed attributes
-    return {
-        "disclosure_id": {"S": masked["disclosure_id"]},
-        "institution_name": {"S": masked["institution_name"]},
-        "transaction_type": {"S": masked["transaction_type"]},
-        "transaction_amount": {"N": masked["transaction_amount"]},  # string like "123.45"
-        "transaction_date": {"S": masked["transaction_date"]},      # "YYYY-MM-DD"
-        "reporting_region": {"S": masked["reporting_region"]},
-        "ssn_masked": {"S": masked["ssn_masked"]},
-        "email_masked": {"S": masked["email_masked"]},
-        "ssn_hash": {"S": masked["ssn_hash"]},
-        "email_hash": {"S": masked["email_hash"]},
-        "created_at": {"S": masked["created_at"]},
+        return False, "invalid_email_format", {}
+
+    # created_at shape check: YYYY-MM-DDTHH:MM:SS[.ffffff][Z]
+    if not CREATED_RE.match(r["created_at"]):
+        return False, "invalid_created_at", {}
+
+    # tx type and region already matched exact set members, so they carry
+    # no surrounding whitespace ($ in SSN_RE/EMAIL_RE allows a trailing \n)
+    return True, "", {
+        "disclosure_id": r["disclosure_id"],
+        "institution_name": r["institution_name"].strip(),
+        "transaction_type": r["transaction_type"],
+        "transaction_amount": amount,
+        "transaction_date": tx_date,
+        "reporting_region": r["reporting_region"],
+        "ssn": r["ssn"].strip(),
+        "email": r["email"].strip(),
+        "created_at": r["created_at"].strip(),
     }
 
 
-def batch_write(items: List[Dict[str, Any]]) -> None:
-    # BatchWriteItem max 25 items per request
-    for i in range(0, len(items), 25):
-        chunk = items[i:i+25]
-        req = {DDB_TABLE_NAME: [{"PutRequest": {"Item": it}} for it in chunk]}
-        resp = ddb.batch_write_item(RequestItems=req)
-        # Retry unprocessed a few times (simple)
-        retries = 0
-        while resp.get("UnprocessedItems") and retries < 5:
+def validate_and_normalize(
+    rows: Iterable[Dict[str, str]], quarantine: BinaryIO
+) -> Tuple[List[Dict[str, str]], int]:
+    # Whole-batch validation loop: returns (parsed valid rows, invalid count).
+    # Invalid rows go straight to the quarantine JSONL file as they are seen.
+    # Callables are bound to locals once per batch rather than looked up as
+    # globals/attributes on every row.
+    valid: List[Dict[str, str]] = []
+    invalid_count = 0
+    add_valid = valid.append
+    write_invalid = quarantine.write
+    validate = validate_row
+    for row in rows:
+        ok, reason, parsed = validate(row)
+        if ok:
+            add_valid(parsed)
+        else:
+            write_invalid(dumps_line({"row": row, "error": reason}))
+            invalid_count += 1
+    return valid, invalid_count
+
+
+def tokenize(text: str) -> List[str]:
+    # "Hall and Sons, LLC" -> ["hall", "and", "sons", "llc"] (deduped, order kept)
+    return list(dict.fromkeys(t for t in TOKEN_SPLIT_RE.split(text.casefold()) if t))
+
+
+def to_token_items(disclosure_id: str, institution_name: str) -> List[Dict[str, Any]]:
+    # One item per (token, disclosure_id) in the token index table
+    return [
+        {"token": {"S": t}, "disclosure_id": {"S": disclosure_id}}
+        for t in tokenize(institution_name)
+    ]
+
+
+def build_outputs(
+    rows: List[Dict[str, str]], curated: BinaryIO
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    # Single pass over validate_row's parsed rows: each value is used as-is
+    # for the curated JSONL line (written to `curated` immediately), the
+    # typed DynamoDB item and its tokens
+    ssns = [r["ssn"] for r in rows]
+    emails = [r["email"] for r in rows]
+    # Row count is known up front, so size the item list once
+    ddb_items: List[Any] = [None] * len(rows)
+    token_items = []
+    write_curated = curated.write
+    for i, (r, ssn, email, ssn_hash, email_hash) in enumerate(zip(
+        rows, ssns, emails, sha256_batch(ssns), sha256_batch(emails)
+    )):
+        disclosure_id = r["disclosure_id"]
+        institution_name = r["institution_name"]
+        transaction_type = r["transaction_type"]
+        transaction_amount = r["transaction_amount"]  # string like "123.45"
+        transaction_date = r["transaction_date"]      # "YYYY-MM-DD"
+        reporting_region = r["reporting_region"]
+        ssn_masked = mask_ssn(ssn)
+        email_masked = mask_email(email)
+        created_at = r["created_at"]
+
+        write_curated(dumps_line({
+            "disclosure_id": disclosure_id,
+            "institution_name": institution_name,
+            "transaction_type": transaction_type,
+            "transaction_amount": transaction_amount,
+            "transaction_date": transaction_date,
+            "reporting_region": reporting_region,
+            "ssn_masked": ssn_masked,
+            "email_masked": email_masked,
+            "ssn_hash": ssn_hash,
+            "email_hash": email_hash,
+            "created_at": created_at,
+        }))
+        # DynamoDB expects typed attributes
+        ddb_items[i] = {
+            "disclosure_id": {"S": disclosure_id},
+            "institution_name": {"S": institution_name},
+            "transaction_type": {"S": transaction_type},
+            "transaction_amount": {"N": transaction_amount},
+            "transaction_date": {"S": transaction_date},
+            "reporting_region": {"S": reporting_region},
+            "ssn_masked": {"S": ssn_masked},
+            "email_masked": {"S": email_masked},
+            "ssn_hash": {"S": ssn_hash},
+            "email_hash": {"S": email_hash},
+            "created_at": {"S": created_at},
+        }
+        token_items.extend(to_token_items(disclosure_id, institution_name))
+
+    return ddb_items, token_items
+
+
+class UnprocessedItemsError(Exception):
+    """BatchWriteItem still had unprocessed items after all retries."""
+
+
+def _write_chunk(chunk: List[Dict[str, Any]], table_name: str) -> List[Dict[str, Any]]:
+    # One BatchWriteItem call (max 25 requests); returns what DynamoDB left unprocessed
+    resp = ddb.batch_write_item(RequestItems={table_name: chunk})
+    return resp.get("UnprocessedItems", {}).get(table_name, [])
+
+
+def batch_write(items: List[Dict[str, Any]], table_name: str = DDB_TABLE_NAME) -> None:
+    # Collapse to one put per primary key, keeping the last (a later row in
+    # the CSV corrects an earlier one). Chunks are written in parallel and
+    # retried in rounds, so without this an older put could land last, and a
+    # retry chunk could hold the same key twice (rejected by BatchWriteItem).
+    key_attrs = TABLE_KEY_ATTRS[table_name]
+    latest = {tuple(it[a]["S"] for a in key_attrs): it for it in items}
+    pending = [{"PutRequest": {"Item": it}} for it in latest.values()]
+    retries = 0
+    with ThreadPoolExecutor(max_workers=BATCH_WRITE_WORKERS) as pool:
+        while pending:
+            chunks = [pending[i:i+25] for i in range(0, len(pending), 25)]
+            # Unprocessed items from every chunk are re-batched together for
+            # the next round instead of each worker retrying on its own
+            pending = [
+                req
+                for unprocessed in pool.map(lambda c: _write_chunk(c, table_name), chunks)
+                for req in unprocessed
+            ]
+            if not pending:
+                break
+            if retries >= 5:
+                # Fail the invocation so S3 retries the event rather than
+                # leaving the table and token index out of step
+                raise UnprocessedItemsError(
+                    f"{len(pending)} items unprocessed in {table_name}"
+                )
             retries += 1
-            resp = ddb.batch_write_item(RequestItems=resp["UnprocessedItems"])
+            # Exponential backoff with jitter before retrying throttled writes
+            time.sleep(min(2 ** retries * 0.05, 1.0) + random.random() * 0.05)
+
+
+def dumps_line(x: Dict[str, Any]) -> bytes:
+    # One JSONL line as UTF-8 bytes
+    if orjson is not None:
+        # DictReader keys extra fields as None; stdlib json writes that as "null"
+        return orjson.dumps(x, option=orjson.OPT_NON_STR_KEYS) + b"\n"
+    return (json.dumps(x, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def spool_file() -> BinaryIO:
+    # Sink for one JSONL output file
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+
+
+def upload_jsonl(f: BinaryIO, out_key: str) -> None:
+    f.seek(0)
+    s3.upload_fileobj(f, BUCKET_NAME, out_key, Config=TRANSFER_CONFIG)
 
 
 def lambda_handler(event, context):
@@ -156,51 +355,34 @@ def lambda_handler(event, context):
         key = rec["s3"]["object"]["key"]
 
         obj = s3.get_object(Bucket=bucket, Key=key)
-        body = obj["Body"].read()
-
-        # Assume CSV with header row
-        text = body.decode("utf-8")
-        reader = csv.DictReader(io.StringIO(text))
-
-        valid_masked = []
-        invalid_rows = []
-
-        for row in reader:
-            ok, reason = validate_row(row)
-            if not ok:
-                invalid_rows.append({"row": row, "error": reason})
-                continue
-
-            masked = {
-                "disclosure_id": row["disclosure_id"],
-                "institution_name": row["institution_name"].strip(),
-                "transaction_type": row["transaction_type"].strip(),
-                "transaction_amount": parse_amount(row["transaction_amount"]),
-                "transaction_date": parse_date(row["transaction_date"]),
-                "reporting_region": row["reporting_region"].strip(),
-                "ssn_masked": mask_ssn(row["ssn"].strip()),
-                "email_masked": mask_email(row["email"].strip()),
-                "ssn_hash": sha256_hex(row["ssn"].strip()),
-                "email_hash": sha256_hex(row["email"].strip()),
-                "created_at": row["created_at"].strip(),
-            }
-            valid_masked.append(masked)
-
-        # Write valid to DynamoDB
-        if valid_masked:
-            ddb_items = [to_ddb_item(x) for x in valid_masked]
-            batch_write(ddb_items)
-
-        # Write curated masked JSONL to S3
-        if valid_masked:
-            out_key = f"{CURATED_PREFIX}masked_{key.split('/')[-1].replace('.csv','')}.jsonl"
-            jsonl = "\n".join(json.dumps(x, ensure_ascii=False) for x in valid_masked) + "\n"
-            s3.put_object(Bucket=BUCKET_NAME, Key=out_key, Body=jsonl.encode("utf-8"))
-
-        # Write invalid rows to quarantine
-        if invalid_rows:
-            q_key = f"{QUARANTINE_PREFIX}quarantine_{key.split('/')[-1].replace('.csv','')}.jsonl"
-            q_jsonl = "\n".join(json.dumps(x, ensure_ascii=False) for x in invalid_rows) + "\n"
-            s3.put_object(Bucket=BUCKET_NAME, Key=q_key, Body=q_jsonl.encode("utf-8"))
+
+        # Assume CSV with header row; decode while streaming so parsing
+        # overlaps the download and the raw bytes are never held whole
+        # (newline="" lets csv handle line endings inside quoted fields)
+        reader = csv.DictReader(io.TextIOWrapper(obj["Body"], encoding="utf-8", newline=""))
+
+        # JSONL outputs are written line by line as rows are produced,
+        # so no full output list or joined string is ever built
+        with spool_file() as curated, spool_file() as quarantine:
+            valid_rows, invalid_count = validate_and_normalize(reader, quarantine)
+            ddb_items, token_items = build_outputs(valid_rows, curated)
+
+            # Write valid to DynamoDB
+            if ddb_items:
+                batch_write(ddb_items)
+                batch_write(token_items, DDB_TOKENS_TABLE_NAME)
+
+            # Output file names derive from the raw object's base name
+            base = os.path.basename(key).removesuffix(".csv")
+
+            # Write curated masked JSONL to S3
+            if ddb_items:
+                out_key = f"{CURATED_PREFIX}masked_{base}.jsonl"
+                upload_jsonl(curated, out_key)
+
+            # Write invalid rows to quarantine
+            if invalid_count:
+                q_key = f"{QUARANTINE_PREFIX}quarantine_{base}.jsonl"
+                upload_jsonl(quarantine, q_key)
 
     return {"ok": True, "processed_files": len(records)}
\ No newline at end of file
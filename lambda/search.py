@@ -1,20 +1,69 @@
 import os
 import json
+import base64
+import random
+import re
+import time
+from collections import OrderedDict
+try:
+    import orjson
+except ImportError:  # not bundled in the Lambda zip; stdlib json is the fallback
+    orjson = None
+
 import boto3
-from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.config import Config
 
-ddb = boto3.resource("dynamodb")
+# Low-level client: expressions are plain strings and items come back typed,
+# which skips the resource layer's per-call condition/serializer objects.
+# Keep-alive lets warm invocations reuse the TLS connection.
+ddbc = boto3.client("dynamodb", config=Config(
+    max_pool_connections=32,
+    retries={"mode": "adaptive", "max_attempts": 10},
+    tcp_keepalive=True,
+))
 TABLE_NAME = os.environ["DDB_TABLE_NAME"]
+TOKENS_TABLE_NAME = os.environ["DDB_TOKENS_TABLE_NAME"]
 GSI_INSTITUTION_DATE = os.environ["GSI_INSTITUTION_DATE"]
 GSI_REGION_DATE = os.environ["GSI_REGION_DATE"]
 
-table = ddb.Table(TABLE_NAME)
+_deserialize = TypeDeserializer().deserialize
+
+# Must match ingest.py's tokenizer for institution_name
+TOKEN_SPLIT_RE = re.compile(r"[\W_]+")
+
+# GSI results are memoized per warm container for at most this long.
+# Only queries with a small Limit are cached, and the entry count is capped,
+# so the cache stays bounded at CACHE_MAX_ENTRIES * CACHE_MAX_LIMIT items.
+CACHE_TTL_SECONDS = 30
+CACHE_MAX_ENTRIES = 64
+CACHE_MAX_LIMIT = 100
+
+_gsi_cache = OrderedDict()  # key -> (monotonic timestamp, (count, items))
+
+# Attributes returned for list views; ?fields=all returns whole items
+LIST_FIELDS = (
+    "disclosure_id",
+    "institution_name",
+    "transaction_date",
+    "transaction_amount",
+    "reporting_region",
+)
+LIST_PROJECTION_NAMES = {f"#p{i}": f for i, f in enumerate(LIST_FIELDS)}
+LIST_PROJECTION = ",".join(LIST_PROJECTION_NAMES)
+
+def _dumps(body):
+    # API Gateway expects the body as str
+    if orjson is not None:
+        return orjson.dumps(body, default=str).decode("utf-8")
+    return json.dumps(body, default=str)
+
 
 def _resp(status, body):
     return {
         "statusCode": status,
         "headers": {"content-type": "application/json"},
-        "body": json.dumps(body, default=str),
+        "body": _dumps(body),
     }
 
 
@@ -25,6 +74,155 @@ def _int(value, default):
         return default
 
 
+def _from_ddb(item):
+    return {k: _deserialize(v) for k, v in item.items()}
+
+
+def _query_gsi(index_name, hash_attr, hash_value, tx_date=None, limit=None, full=False):
+    # <hash_attr> = :h [AND transaction_date = :d] on one of the GSIs
+    key_expr = "#h = :h"
+    names = {"#h": hash_attr}
+    values = {":h": {"S": hash_value}}
+
+    if tx_date:
+        key_expr += " AND #d = :d"
+        names["#d"] = "transaction_date"
+        values[":d"] = {"S": tx_date}
+
+    args = {
+        "TableName": TABLE_NAME,
+        "IndexName": index_name,
+        "KeyConditionExpression": key_expr,
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+        "ScanIndexForward": True,
+    }
+    if limit is not None:
+        args["Limit"] = limit
+    if not full:
+        args["ProjectionExpression"] = LIST_PROJECTION
+        names.update(LIST_PROJECTION_NAMES)
+
+    resp = ddbc.query(**args)
+    return resp.get("Count", 0), [_from_ddb(it) for it in resp.get("Items", [])]
+
+
+def _cached_gsi(index_name, hash_attr, hash_value, tx_date=None, limit=None, full=False):
+    # Unbounded queries (no Limit) can be a whole 1 MB page; never cache them
+    if limit is None or limit > CACHE_MAX_LIMIT:
+        return _query_gsi(index_name, hash_attr, hash_value, tx_date, limit, full)
+
+    key = (index_name, hash_attr, hash_value, tx_date, limit, full)
+    now = time.monotonic()
+    hit = _gsi_cache.get(key)
+    if hit is not None:
+        ts, (count, items) = hit
+        if now - ts < CACHE_TTL_SECONDS:
+            _gsi_cache.move_to_end(key)
+            return count, list(items)
+        # Expired: evict and re-query
+        del _gsi_cache[key]
+
+    count, items = _query_gsi(index_name, hash_attr, hash_value, tx_date, limit, full)
+    _gsi_cache[key] = (now, (count, tuple(items)))
+    while len(_gsi_cache) > CACHE_MAX_ENTRIES:
+        _gsi_cache.popitem(last=False)  # least recently used
+    return count, items
+
+
+def _encode_cursor(last_key):
+    # Opaque pagination token for the client (LastEvaluatedKey as base64 JSON)
+    if not last_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_key).encode("utf-8")).decode("ascii")
+
+
+def _is_str_attr(value):
+    return isinstance(value, dict) and value.keys() == {"S"} and isinstance(value["S"], str)
+
+
+def _decode_cursor(cursor, token):
+    # Only a token-table key for this same word is a valid ExclusiveStartKey:
+    # {"token": {"S": token}, "disclosure_id": {"S": "..."}}
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        return None
+    if (
+        not isinstance(key, dict)
+        or key.keys() != {"token", "disclosure_id"}
+        or not _is_str_attr(key["token"])
+        or not _is_str_attr(key["disclosure_id"])
+        or key["token"]["S"] != token
+    ):
+        return None
+    return key
+
+
+class UnprocessedKeysError(Exception):
+    """BatchGetItem still had unprocessed keys after all retries."""
+
+
+def _batch_get_items(table_name, keys, extra=None):
+    # BatchGetItem max 100 keys per request; returns raw (typed) items
+    items = []
+    for i in range(0, len(keys), 100):
+        req = {table_name: {"Keys": keys[i:i+100], **(extra or {})}}
+        retries = 0
+        while True:
+            resp = ddbc.batch_get_item(RequestItems=req)
+            items.extend(resp.get("Responses", {}).get(table_name, []))
+            req = resp.get("UnprocessedKeys")
+            if not req:
+                break
+            if retries >= 5:
+                # Returning what we have would look like a complete page
+                raise UnprocessedKeysError(
+                    f"{len(req[table_name]['Keys'])} keys unprocessed in {table_name}"
+                )
+            retries += 1
+            # Exponential backoff with jitter before retrying throttled reads
+            time.sleep(min(2 ** retries * 0.05, 1.0) + random.random() * 0.05)
+    return items
+
+
+def _batch_get(ids, full=False):
+    # Full disclosure rows for ids, kept in the token-index order
+    extra = None
+    if not full:
+        extra = {
+            "ProjectionExpression": LIST_PROJECTION,
+            "ExpressionAttributeNames": LIST_PROJECTION_NAMES,
+        }
+    keys = [{"disclosure_id": {"S": d}} for d in ids]
+    found = {
+        it["disclosure_id"]["S"]: _from_ddb(it)
+        for it in _batch_get_items(TABLE_NAME, keys, extra)
+    }
+    return [found[d] for d in ids if d in found]
+
+
+def _tokenize(text):
+    return list(dict.fromkeys(t for t in TOKEN_SPLIT_RE.split(text.casefold()) if t))
+
+
+def _with_all_tokens(ids, tokens):
+    # Keep ids whose institution_name also has every one of `tokens`, by
+    # looking up the exact (token, disclosure_id) keys in the token index
+    if not ids or not tokens:
+        return ids
+    keys = [
+        {"token": {"S": t}, "disclosure_id": {"S": d}}
+        for t in tokens
+        for d in ids
+    ]
+    hits = {}
+    for it in _batch_get_items(TOKENS_TABLE_NAME, keys):
+        d = it["disclosure_id"]["S"]
+        hits[d] = hits.get(d, 0) + 1
+    return [d for d in ids if hits.get(d) == len(tokens)]
+
+
 def lambda_handler(event, context):
 
     raw_path = event.get("rawPath") or ""
@@ -38,6 +236,8 @@ def lambda_handler(event, context):
     region = qs.get("region")
     tx_date = qs.get("date")
     contains = qs.get("contains")
+    cursor = qs.get("cursor")
+    full = qs.get("fields") == "all"
     limit = _int(qs.get("limit"), 25)
 
     # ------------------------------------------------------------
@@ -51,21 +251,13 @@ def lambda_handler(event, context):
                 "error": "GET / requires ?institution=... for ordered results"
             })
 
-        key_expr = Key("institution_name").eq(institution)
-
-        if tx_date:
-            key_expr = key_expr & Key("transaction_date").eq(tx_date)
-
-        resp = table.query(
-            IndexName=GSI_INSTITUTION_DATE,
-            KeyConditionExpression=key_expr,
-            Limit=limit,
-            ScanIndexForward=True
+        count, items = _cached_gsi(
+            GSI_INSTITUTION_DATE, "institution_name", institution, tx_date, limit, full
         )
 
         return _resp(200, {
-            "count": resp.get("Count", 0),
-            "items": resp.get("Items", [])
+            "count": count,
+            "items": items
         })
 
     # ------------------------------------------------------------
@@ -73,20 +265,13 @@ def lambda_handler(event, context):
     # ------------------------------------------------------------
     if institution:
 
-        key_expr = Key("institution_name").eq(institution)
-
-        if tx_date:
-            key_expr = key_expr & Key("transaction_date").eq(tx_date)
-
-        resp = table.query(
-            IndexName=GSI_INSTITUTION_DATE,
-            KeyConditionExpression=key_expr,
-            ScanIndexForward=True
+        count, items = _cached_gsi(
+            GSI_INSTITUTION_DATE, "institution_name", institution, tx_date, limit, full
         )
 
         return _resp(200, {
-            "count": resp.get("Count", 0),
-            "items": resp.get("Items", [])
+            "count": count,
+            "items": items
         })
 
     # ------------------------------------------------------------
@@ -94,36 +279,51 @@ def lambda_handler(event, context):
     # ------------------------------------------------------------
     if region:
 
-        key_expr = Key("reporting_region").eq(region)
-
-        if tx_date:
-            key_expr = key_expr & Key("transaction_date").eq(tx_date)
-
-        resp = table.query(
-            IndexName=GSI_REGION_DATE,
-            KeyConditionExpression=key_expr,
-            ScanIndexForward=True
+        count, items = _cached_gsi(
+            GSI_REGION_DATE, "reporting_region", region, tx_date, limit, full
         )
 
         return _resp(200, {
-            "count": resp.get("Count", 0),
-            "items": resp.get("Items", [])
+            "count": count,
+            "items": items
         })
 
     # ------------------------------------------------------------
-    # Keyword search fallback (scan)
+    # Keyword search via token index (token -> disclosure_id)
     # ------------------------------------------------------------
     if contains:
 
-        resp = table.scan(
-            FilterExpression=
-                Attr("institution_name").contains(contains) |
-                Attr("description").contains(contains)
-        )
+        # Multi-word queries match rows containing every word: page through
+        # the first word's postings and check the rest by exact key lookup
+        tokens = _tokenize(contains)
+        if not tokens:
+            return _resp(400, {"error": "?contains= needs at least one word"})
+
+        query_args = {
+            "TableName": TOKENS_TABLE_NAME,
+            "KeyConditionExpression": "#t = :t",
+            "ExpressionAttributeNames": {"#t": "token"},
+            "ExpressionAttributeValues": {":t": {"S": tokens[0]}},
+            "Limit": limit,
+        }
+
+        if cursor:
+            start_key = _decode_cursor(cursor, tokens[0])
+            if start_key is None:
+                return _resp(400, {"error": "invalid cursor"})
+            query_args["ExclusiveStartKey"] = start_key
+
+        resp = ddbc.query(**query_args)
+        ids = [it["disclosure_id"]["S"] for it in resp.get("Items", [])]
+        try:
+            items = _batch_get(_with_all_tokens(ids, tokens[1:]), full)
+        except UnprocessedKeysError:
+            return _resp(503, {"error": "search is throttled, retry shortly"})
 
         return _resp(200, {
-            "count": resp.get("Count", 0),
-            "items": resp.get("Items", [])
+            "count": len(items),
+            "items": items,
+            "cursor": _encode_cursor(resp.get("LastEvaluatedKey"))
         })
 
     return _resp(400, {
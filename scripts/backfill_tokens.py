@@ -0,0 +1,62 @@
+import re, sys, time
+import boto3
+
+# One-off: fill the keyword token table from disclosures ingested before it
+# existed. Safe to re-run; token items are plain puts keyed on
+# (token, disclosure_id).
+#
+# usage: python3 backfill_tokens.py <disclosures_table> <tokens_table>
+
+# Must match lambda/ingest.py's tokenizer
+TOKEN_SPLIT_RE = re.compile(r"[\W_]+")
+
+def tokenize(text):
+    return list(dict.fromkeys(t for t in TOKEN_SPLIT_RE.split(text.casefold()) if t))
+
+def write_batch(ddb, tokens_table, reqs):
+    retries = 0
+    while reqs:
+        resp = ddb.batch_write_item(RequestItems={tokens_table: reqs})
+        reqs = resp.get("UnprocessedItems", {}).get(tokens_table, [])
+        if reqs:
+            retries += 1
+            if retries > 8:
+                raise RuntimeError(f"{len(reqs)} token items still unprocessed")
+            time.sleep(min(2 ** retries * 0.05, 2.0))
+
+def main(table, tokens_table):
+    ddb = boto3.client("dynamodb")
+    pages = ddb.get_paginator("scan").paginate(
+        TableName=table,
+        ProjectionExpression="#d,#i",
+        ExpressionAttributeNames={"#d": "disclosure_id", "#i": "institution_name"},
+    )
+
+    pending = []
+    rows = 0
+    written = 0
+    for page in pages:
+        for it in page.get("Items", []):
+            rows += 1
+            if "institution_name" not in it:
+                continue
+            for t in tokenize(it["institution_name"]["S"]):
+                pending.append({"PutRequest": {"Item": {
+                    "token": {"S": t},
+                    "disclosure_id": it["disclosure_id"],
+                }}})
+            # BatchWriteItem max 25 items per request
+            while len(pending) >= 25:
+                write_batch(ddb, tokens_table, pending[:25])
+                written += 25
+                pending = pending[25:]
+    if pending:
+        write_batch(ddb, tokens_table, pending)
+        written += len(pending)
+
+    print(f"Indexed {rows} disclosures into {written} token items in {tokens_table}")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python3 backfill_tokens.py <disclosures_table> <tokens_table>")
+    main(sys.argv[1], sys.argv[2])
@@ -7,28 +7,53 @@ fake = Faker()
 TX_TYPES = ["WIRE", "ACH", "CARD", "CASH", "CHECK"]
 REGIONS = ["NE", "MW", "S", "W"]
 
-def rand_date(start_days_ago=365):
-    d = date.today() - timedelta(days=random.randint(0, start_days_ago))
-    return d.isoformat()
-
-def gen_row():
-    return {
-        "disclosure_id": str(uuid.uuid4()),
-        "institution_name": fake.company(),
-        "transaction_type": random.choice(TX_TYPES),
-        "transaction_amount": round(random.uniform(10, 250000), 2),
-        "transaction_date": rand_date(),
-        "reporting_region": random.choice(REGIONS),
-        "ssn": fake.ssn(),          # synthetic
-        "email": fake.email(),      # synthetic
-        "created_at": datetime.utcnow().isoformat(timespec="seconds")
-    }
-
-rows = [gen_row() for _ in range(1000)]
+FIELDNAMES = [
+    "disclosure_id",
+    "institution_name",
+    "transaction_type",
+    "transaction_amount",
+    "transaction_date",
+    "reporting_region",
+    "ssn",
+    "email",
+    "created_at",
+]
+
+N_ROWS = 1000
+
+def gen_numeric_cols(n, start_days_ago=365):
+    # Categorical/numeric columns are drawn a whole column at a time
+    today = date.today()
+    dates = [(today - timedelta(days=o)).isoformat()
+             for o in random.choices(range(start_days_ago + 1), k=n)]
+    amounts = [round(random.uniform(10, 250000), 2) for _ in range(n)]
+    return (
+        random.choices(TX_TYPES, k=n),
+        amounts,
+        dates,
+        random.choices(REGIONS, k=n),
+    )
+
+def gen_rows(n):
+    tx_types, amounts, dates, regions = gen_numeric_cols(n)
+    created_at = datetime.utcnow().isoformat(timespec="seconds")
+    # Faker/uuid fields can't be drawn in bulk, so they stay per row
+    for i in range(n):
+        yield [
+            str(uuid.uuid4()),
+            fake.company(),
+            tx_types[i],
+            amounts[i],
+            dates[i],
+            regions[i],
+            fake.ssn(),          # synthetic
+            fake.email(),        # synthetic
+            created_at,
+        ]
 
 with open("financial_disclosures_raw.csv", "w", newline="", encoding="utf-8") as f:
-    w = csv.DictWriter(f, fieldnames=rows[0].keys())
-    w.writeheader()
-    w.writerows(rows)
+    w = csv.writer(f)
+    w.writerow(FIELDNAMES)
+    w.writerows(gen_rows(N_ROWS))
 
-print("Wrote financial_disclosures_raw.csv with 1000 rows")
\ No newline at end of file
+print(f"Wrote financial_disclosures_raw.csv with {N_ROWS} rows")
@@ -93,6 +93,27 @@ resource "aws_dynamodb_table" "disclosures" {
   }
 }
 
+# -------------------------
+# DynamoDB token index (institution_name token -> disclosure_id)
+# -------------------------
+resource "aws_dynamodb_table" "disclosure_tokens" {
+  name         = "${var.project}-disclosure_tokens"
+  billing_mode = "PAY_PER_REQUEST"
+
+  hash_key  = "token"
+  range_key = "disclosure_id"
+
+  attribute {
+    name = "token"
+    type = "S"
+  }
+
+  attribute {
+    name = "disclosure_id"
+    type = "S"
+  }
+}
+
 # -------------------------
 # IAM role/policy for Lambda
 # -------------------------
@@ -126,6 +147,7 @@ resource "aws_iam_role_policy" "lambda_policy" {
         Action = [
           "s3:GetObject",
           "s3:PutObject",
+          "s3:AbortMultipartUpload",
           "s3:ListBucket"
         ]
         Resource = [
@@ -141,7 +163,8 @@ resource "aws_iam_role_policy" "lambda_policy" {
           "dynamodb:PutItem"
         ]
         Resource = [
-          aws_dynamodb_table.disclosures.arn
+          aws_dynamodb_table.disclosures.arn,
+          aws_dynamodb_table.disclosure_tokens.arn
         ]
       },
       # Read from DyanmoDB (search)
@@ -149,12 +172,13 @@ resource "aws_iam_role_policy" "lambda_policy" {
         Effect = "Allow"
         Action = [
           "dynamodb:GetItem",
-          "dynamodb:Query",
-          "dynamodb:Scan"
+          "dynamodb:BatchGetItem",
+          "dynamodb:Query"
         ]
         Resource = [
           aws_dynamodb_table.disclosures.arn,
-          "${aws_dynamodb_table.disclosures.arn}/index/*"
+          "${aws_dynamodb_table.disclosures.arn}/index/*",
+          aws_dynamodb_table.disclosure_tokens.arn
         ]
       },
       # CloudWatch Logs
@@ -194,11 +218,12 @@ resource "aws_lambda_function" "ingest" {
 
   environment {
     variables = {
-      BUCKET_NAME       = aws_s3_bucket.data.bucket
-      CURATED_PREFIX    = local.curated_prefix
-      QUARANTINE_PREFIX = local.quarantine_prefix
-      DDB_TABLE_NAME    = aws_dynamodb_table.disclosures.name
-      PII_HASH_SALT     = var.pii_hash_salt
+      BUCKET_NAME           = aws_s3_bucket.data.bucket
+      CURATED_PREFIX        = local.curated_prefix
+      QUARANTINE_PREFIX     = local.quarantine_prefix
+      DDB_TABLE_NAME        = aws_dynamodb_table.disclosures.name
+      DDB_TOKENS_TABLE_NAME = aws_dynamodb_table.disclosure_tokens.name
+      PII_HASH_SALT         = var.pii_hash_salt
     }
   }
 }
@@ -252,6 +277,7 @@ resource "aws_lambda_function" "search" {
   environment {
     variables = {
       DDB_TABLE_NAME = aws_dynamodb_table.disclosures.name
+      DDB_TOKENS_TABLE_NAME = aws_dynamodb_table.disclosure_tokens.name
 
       # Your code can choose index based on query params
       GSI_INSTITUTION_DATE = "gsi_institution_date"
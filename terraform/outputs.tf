@@ -6,6 +6,10 @@ output "dynamodb_table" {
   value = aws_dynamodb_table.disclosures.name
 }
 
+output "dynamodb_tokens_table" {
+  value = aws_dynamodb_table.disclosure_tokens.name
+}
+
 output "lambda_name" {
   value = aws_lambda_function.ingest.function_name
 }